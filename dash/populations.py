@@ -0,0 +1,159 @@
+"""Population distributions for demonstrating the central limit theorem.
+
+Every population is shifted and scaled to have mean 0 and a requested
+standard deviation. Draws come from lookup tables that are built once for
+each (population, sd) pair: an inverse CDF for continuous distributions and
+an alias table for discrete ones, so a draw of any size is a few vectorized
+array operations.
+
+"""
+from functools import lru_cache
+
+import numpy as np
+from scipy import stats
+
+
+# Resolution of the inverse CDF table; the tails are truncated at 1 / (2 * n)
+n_quantiles = 2 ** 16
+
+# Ignore discrete outcomes less likely than this
+min_probability = 1e-9
+
+# Bimodal population: equal mixture of two normals at +/- bimodal_loc
+bimodal_loc = 1.5
+bimodal_scale = .6
+
+
+populations = {
+    "normal": dict(label="Normal", dist=stats.norm()),
+    "uniform": dict(label="Uniform", dist=stats.uniform(-.5, 1)),
+    "skewed": dict(label="Right-skewed (gamma)", dist=stats.gamma(2)),
+    "exponential": dict(label="Very skewed (exponential)",
+                        dist=stats.expon()),
+    "heavy": dict(label="Heavy-tailed (t, 3 d.f.)", dist=stats.t(3)),
+    "bimodal": dict(label="Bimodal (mixture of normals)", dist=None),
+    "counts": dict(label="Discrete counts (Poisson)", dist=stats.poisson(1.5)),
+    "binary": dict(label="Binary outcome (Bernoulli)",
+                   dist=stats.bernoulli(.25)),
+}
+
+
+def options():
+    """Dropdown options for the available populations."""
+    return [{"label": p["label"], "value": k} for k, p in populations.items()]
+
+
+def is_discrete(name):
+    dist = populations[name]["dist"]
+    return dist is not None and isinstance(dist.dist, stats.rv_discrete)
+
+
+# --- Shape of each population before standardization
+
+def _moments(name):
+    if name == "bimodal":
+        return 0, np.sqrt(bimodal_loc ** 2 + bimodal_scale ** 2)
+    dist = populations[name]["dist"]
+    return dist.mean(), dist.std()
+
+
+def _bimodal_pdf(x):
+    return .5 * (
+        stats.norm.pdf(x, -bimodal_loc, bimodal_scale)
+        + stats.norm.pdf(x, bimodal_loc, bimodal_scale)
+    )
+
+
+def _bimodal_ppf(q):
+    # There is no closed form, so invert the CDF numerically on a fine grid
+    lim = bimodal_loc + 10 * bimodal_scale
+    x = np.linspace(-lim, lim, 100_001)
+    cdf = .5 * (
+        stats.norm.cdf(x, -bimodal_loc, bimodal_scale)
+        + stats.norm.cdf(x, bimodal_loc, bimodal_scale)
+    )
+    return np.interp(q, cdf, x)
+
+
+# --- Cached tables
+
+@lru_cache(maxsize=None)
+def _quantiles(name):
+    q = (np.arange(n_quantiles) + .5) / n_quantiles
+    if name == "bimodal":
+        return _bimodal_ppf(q)
+    return populations[name]["dist"].ppf(q)
+
+
+def _table_moments(name):
+    # Use the moments of the truncated table rather than of the distribution,
+    # so heavy tails do not pull the sd of the draws below what was asked for
+    values = _quantiles(name)
+    return values.mean(), values.std()
+
+
+@lru_cache(maxsize=None)
+def _quantile_table(name, sd):
+    mu, sigma = _table_moments(name)
+    return (_quantiles(name) - mu) / sigma * sd
+
+
+@lru_cache(maxsize=None)
+def _alias_table(name, sd):
+    mu, sigma = _moments(name)
+    dist = populations[name]["dist"]
+    lo, hi = dist.ppf([min_probability, 1 - min_probability])
+    support = np.arange(lo, hi + 1)
+    p = dist.pmf(support)
+    p /= p.sum()
+
+    # Vose's method: pair each underfull outcome with an overfull one
+    n = len(p)
+    prob = p * n
+    alias = np.arange(n)
+    small = [i for i in range(n) if prob[i] < 1]
+    large = [i for i in range(n) if prob[i] >= 1]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] -= 1 - prob[s]
+        (small if prob[l] < 1 else large).append(l)
+    prob[small + large] = 1
+
+    values = (support - mu) / sigma * sd
+    return values, p, prob, alias
+
+
+def draw(name, sd, size, rng):
+    """Draw an array of the given size from a standardized population."""
+    if is_discrete(name):
+        values, _, prob, alias = _alias_table(name, sd)
+        i = rng.integers(0, len(values), size)
+        keep = rng.random(size) < prob[i]
+        return values[np.where(keep, i, alias[i])]
+
+    # Linearly interpolate between adjacent quantiles
+    table = _quantile_table(name, sd)
+    pos = rng.random(size) * n_quantiles - .5
+    pos = np.clip(pos, 0, n_quantiles - 1)
+    i = np.minimum(pos.astype(int), n_quantiles - 2)
+    frac = pos - i
+    return table[i] + frac * (table[i + 1] - table[i])
+
+
+@lru_cache(maxsize=None)
+def density(name, sd, lim=9, n_points=5001):
+    """Return x and the PDF (or the support and PMF) of a population."""
+    if is_discrete(name):
+        values, pmf, _, _ = _alias_table(name, sd)
+        show = np.abs(values) <= lim
+        return values[show], pmf[show]
+
+    mu, sigma = _table_moments(name)
+    x = np.linspace(-lim, lim, n_points)
+    z = x / sd * sigma + mu
+    if name == "bimodal":
+        pdf = _bimodal_pdf(z)
+    else:
+        pdf = populations[name]["dist"].pdf(z)
+    return x, pdf * sigma / sd
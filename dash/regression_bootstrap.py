@@ -1,12 +1,15 @@
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 
 import numpy as np
 from scipy import stats
 
+import regression_data
+import simulations
+
 
 # --- Define the underlying regression model
 
@@ -14,34 +17,68 @@ rng = np.random.default_rng()
 n_obs = 30
 n_boot = 20
 
+# Every shuffle touches every observation, so only test moderate datasets
+perm_max_obs = 20_000
+
 # Simple y = ax + b + noise model
-x = rng.uniform(-3, 3, n_obs)
-y = 2 + .75 * x + rng.normal(0, 1.5, n_obs)
-
-# Fit a regression using OLS
-fit = np.polyfit(x, y, 1)
-xx = np.linspace(-3.5, 3.5, 101)
-yhat = np.polyval(fit, xx)
-
-# Compute the analytic confidence interval for the regression
-dof = n_obs - 2
-xbar = x.mean()
-ss_x = np.sum(np.square(x - xbar))
-s = np.sqrt(np.sum(np.square(y - np.polyval(fit, x))) / dof)
-se_x = s * np.sqrt(1 / n_obs + np.square(xx - xbar) / ss_x)
-z = stats.t(dof).ppf(.975)
-ci = yhat - z * se_x, yhat + z * se_x
-
-# Fit the regression for a small number of bootstrap samples
-boot_samples = []
-yhat_boots = []
-for _ in range(n_boot):
-    sampler = np.random.randint(0, n_obs, n_obs)
-    x_boot = x[sampler]
-    y_boot = y[sampler]
-    fit_boot = np.polyfit(x_boot, y_boot, 1)
-    boot_samples.append(sampler)
-    yhat_boots.append(np.polyval(fit_boot, xx))
+x, y = simulations.simulate_regression(n_obs, 1.5, rng=rng)
+
+default_key = regression_data.register_dataset(
+    x, y, key="default", pinned=True,
+)
+
+expired_message = (
+    "The uploaded data is no longer stored on the server, so the simulated "
+    "data is shown instead; upload the file again to use it"
+)
+
+
+def fit_models(key):
+    """Fit the regression, its analytic CI, and bootstraps on the full data.
+
+    Falls back to the default data if the dataset has been evicted.
+
+    """
+    data = regression_data.get_dataset(key)
+    if data is None:
+        key = default_key
+        data = regression_data.get_dataset(key)
+    if "bootstrap" in data:
+        return data
+
+    if key == default_key:
+        xlim = -3.5, 3.5
+        xrange, yrange = (-4, 4), (-3, 7)
+    else:
+        xlim = data["xrange"]
+        xrange, yrange = data["xrange"], data["yrange"]
+    xx = np.linspace(*xlim, 101)
+
+    # Fit a regression using OLS, with its analytic confidence interval, and
+    # refit it for a small number of bootstrap samples
+    fit = simulations.regression_ci(data["x"], data["y"], xx)
+    boots = simulations.bootstrap_regression(
+        data["x"], data["y"], xx, n_boot, rng=rng,
+    )
+
+    data["bootstrap"] = dict(
+        xrange=xrange, yrange=yrange,
+        xx=xx, yhat=fit["yhat"], dof=fit["dof"], se_x=fit["se_x"],
+        ci=fit["ci"],
+        boot_counts=boots["boot_counts"], yhat_boots=boots["yhat_boots"],
+    )
+    return data
+
+
+def permutation_results(key, n_perm):
+    """Run the permutation test once per dataset and number of shuffles."""
+    data = fit_models(key)
+    cache = data.setdefault("permutation", {})
+    if n_perm not in cache:
+        cache[n_perm] = simulations.permutation_test(
+            data["x"], data["y"], n_perm, rng=rng,
+        )
+    return cache[n_perm]
 
 
 # --- Define the layout of the app
@@ -53,6 +90,25 @@ app.layout = dbc.Container([
 
     html.H1("Confidence intervals on regression model"),
 
+    dcc.Store(id="dataset", data=default_key),
+    dcc.Store(id="upload-message", data=""),
+
+    dcc.Upload(
+        id="upload-data",
+        children=html.Div([
+            "Drag and drop or ", html.A("select a CSV file"),
+            " with x and y columns to use your own data",
+        ]),
+        max_size=regression_data.max_upload_bytes,
+        style={
+            "borderWidth": "1px", "borderStyle": "dashed",
+            "borderRadius": "5px", "textAlign": "center",
+            "padding": "10px", "margin": "10px 0",
+        },
+    ),
+
+    html.Div(id="upload-status"),
+
     dcc.Graph(
         id="plot",
         clear_on_unhover=True,
@@ -69,24 +125,87 @@ app.layout = dbc.Container([
         value="bootstrap",
     ),
 
+    html.H4("Permutation test of the slope"),
+
+    dcc.RadioItems(
+        id="perm-count",
+        options=[
+            {"label": "Off", "value": 0},
+            {"label": "1,000 shuffles", "value": 1000},
+            {"label": "10,000 shuffles", "value": 10000},
+        ],
+        value=0,
+    ),
+
+    dcc.Graph(id="perm-plot", style={"display": "none"}),
+
+    html.Pre(id="perm-text"),
+
 ])
 
 
+# --- Load a user-supplied dataset
+
+@app.callback(
+    [Output("dataset", "data"), Output("upload-message", "data")],
+    [Input("upload-data", "contents")],
+    [State("upload-data", "filename")],
+)
+def load_upload(contents, filename):
+    if contents is None:
+        return default_key, ""
+    try:
+        x_up, y_up = regression_data.parse_upload(contents)
+    except ValueError as err:
+        return dash.no_update, f"Could not use {filename}: {err}"
+    key = regression_data.register_dataset(x_up, y_up)
+    fit_models(key)
+    return key, f"Using {filename} ({len(x_up)} observations)"
+
+
+# Check again on every interaction, as other uploads can evict this one
+@app.callback(
+    Output("upload-status", "children"),
+    [Input("dataset", "data"),
+     Input("upload-message", "data"),
+     Input("hover-action", "value"),
+     Input("perm-count", "value")],
+)
+def show_status(key, message, *_):
+    if regression_data.get_dataset(key) is None:
+        return expired_message
+    return message
+
+
 # --- Define the interaction with the graph
 
 @app.callback(
     Output("plot", "figure"),
-    [Input("hover-action", "value"),
+    [Input("dataset", "data"),
+     Input("hover-action", "value"),
      Input("plot", "hoverData")],
 )
-def plot_scatter(hover_action, hover_data):
+def plot_scatter(key, hover_action, hover_data):
+
+    data = fit_models(key)
+    fits = data["bootstrap"]
+    xx, yhat, ci = fits["xx"], fits["yhat"], fits["ci"]
+
+    # Only draw a subset of the observations when there are very many
+    display = data["display"]
+    x, y = data["x"][display], data["y"][display]
+    n_obs = len(display)
+    scatter_type = (
+        "scattergl" if n_obs > regression_data.webgl_threshold else "scatter"
+    )
 
     # Set up the figure
+    xrange, yrange = fits["xrange"], fits["yrange"]
     layout = {
         "width": 800,
         "height": 600,
-        "xaxis": {"range": (-4, 4), "title": "x"},
-        "yaxis": {"range": (-3, 7), "title": "y"},
+        "xaxis": {"range": xrange, "title": "x"},
+        "yaxis": {"range": yrange, "title": "y"},
         "hovermode": 'closest',
     }
 
@@ -95,7 +214,7 @@ def plot_scatter(hover_action, hover_data):
     boot_red = "#cc2222"
     boot_gray = "#999999"
     scatter_color = "#222222"
-    scatter_size = 10
+    scatter_size = 10 if n_obs <= regression_data.webgl_threshold else 4
 
     # Process the hover action
     hover_line = None
@@ -106,7 +225,7 @@ def plot_scatter(hover_action, hover_data):
         hover_point = hover_element["pointIndex"]
 
     # Set up the list of graph elements
-    data = []
+    traces = []
 
     # Define the parameters of the bootstrap sample lines, based on hover
     show_bootstrap_sample = (
@@ -116,14 +235,14 @@ def plot_scatter(hover_action, hover_data):
     )
     if show_bootstrap_sample:
         hover_sample = hover_line
-        used, count = np.unique(boot_samples[hover_sample], return_counts=True)
-        show_obs = np.in1d(np.arange(n_obs), used)
+        count = fits["boot_counts"][hover_sample][display]
+        show_obs = count > 0
         scatter_color = np.where(show_obs, boot_red, boot_gray)
-        scatter_size = np.full(n_obs, 10)
-        scatter_size[show_obs] = 10 * np.sqrt(count)
+        scatter_size = np.full(n_obs, scatter_size, float)
+        scatter_size[show_obs] *= np.sqrt(count[show_obs])
 
     # Plot the regression line for each bootstrap sample
-    for i, yhat_boot in enumerate(yhat_boots):
+    for i, yhat_boot in enumerate(fits["yhat_boots"]):
 
         width = 1.5
         color = boot_gray
@@ -132,7 +251,7 @@ def plot_scatter(hover_action, hover_data):
             width = 2.5
             color = boot_red
 
-        data.append({
+        traces.append({
             "x": xx, "y": yhat_boot,
             "mode": "lines", "showlegend": False,
             "line": {"color": color, "width": width},
@@ -140,7 +259,7 @@ def plot_scatter(hover_action, hover_data):
         })
 
     # Plot the regression estimate and its confidence interval
-    data.extend([
+    traces.extend([
         {
             "x": xx, "y": yhat,
             "mode": "lines", "showlegend": False,
@@ -163,7 +282,8 @@ def plot_scatter(hover_action, hover_data):
     ])
 
     # Plot the observations
-    data.append({
+    traces.append({
+        "type": scatter_type,
         "x": x, "y": y,
         "mode": "markers", "showlegend": False,
         "marker": {"color": scatter_color, "size": scatter_size},
@@ -179,12 +299,13 @@ def plot_scatter(hover_action, hover_data):
     if show_yhat_error:
 
         err_loc = yhat[hover_point]
-        err_sd = se_x[hover_point]
+        err_sd = fits["se_x"][hover_point]
         err_y = np.linspace(err_loc - err_sd * 5, err_loc + err_sd * 5, 100)
-        err_dist = stats.t(dof, loc=err_loc, scale=err_sd)
-        err_x = xx[hover_point] + err_dist.pdf(err_y) * .5
+        err_dist = stats.t(fits["dof"], loc=err_loc, scale=err_sd)
+        err_scale = .5 * np.diff(xrange)[0] / 8 * np.diff(yrange)[0] / 10
+        err_x = xx[hover_point] + err_dist.pdf(err_y) * err_scale
 
-        data.extend([
+        traces.extend([
             {
                 "x": np.full_like(err_y, xx[hover_point]), "y": err_y,
                 "mode": "lines", "showlegend": False,
@@ -200,12 +321,85 @@ def plot_scatter(hover_action, hover_data):
         ])
 
     fig = {
-        "data": data,
+        "data": traces,
         "layout": layout,
     }
 
     return fig
 
 
+# --- Compare the observed slope to its distribution when y is shuffled
+
+@app.callback(
+    [Output("perm-plot", "figure"),
+     Output("perm-plot", "style"),
+     Output("perm-text", "children")],
+    [Input("dataset", "data"), Input("perm-count", "value")],
+)
+def plot_permutation(key, n_perm):
+
+    hidden = {"display": "none"}
+    if not n_perm:
+        return {}, hidden, ""
+
+    data = fit_models(key)
+    if data["n_obs"] > perm_max_obs:
+        return {}, hidden, (
+            f"The permutation test is limited to {perm_max_obs} observations"
+        )
+
+    perm = permutation_results(key, n_perm)
+    slope = perm["slope"]
+    null_slopes = perm["null_slopes"]
+
+    # Bin the null distribution here so only the counts go to the browser
+    lim = max(np.abs(null_slopes).max(), abs(slope)) * 1.1
+    edges = np.linspace(-lim, lim, 61)
+    counts, _ = np.histogram(null_slopes, edges)
+    extreme = np.abs(edges[:-1] + np.diff(edges) / 2) >= abs(slope)
+
+    traces = [{
+        "type": "bar",
+        "x": edges[:-1], "y": counts,
+        "width": np.diff(edges), "offset": 0,
+        "marker": {"color": np.where(extreme, "#cc2222", "#999999")},
+        "showlegend": False,
+        "hoverinfo": "skip",
+    }]
+
+    layout = {
+        "width": 800,
+        "height": 300,
+        "xaxis": {"range": (-lim, lim), "title": "Slope with y shuffled"},
+        "yaxis": {"title": "Count"},
+        "bargap": 0,
+        "shapes": [
+            {
+                "type": "line",
+                "yref": "paper", "y0": 0, "y1": 1,
+                "xref": "x", "x0": x0, "x1": x0,
+                "line": {"color": "#222299", "width": 2, "dash": dash},
+            }
+            for x0, dash in [(slope, "solid"), (-slope, "dot")]
+        ],
+    }
+
+    lines = [
+        f"Observed slope: {slope:.4g}",
+        f"Permutation p (Monte Carlo, {n_perm} shuffles): "
+        f"{perm['p_mc']:.4f} +/- {perm['p_mc_se']:.4f}",
+    ]
+    if np.isnan(perm["p_exact"]):
+        lines.append(
+            f"Permutation p (exact): too many orderings of {data['n_obs']} "
+            "observations to enumerate"
+        )
+    else:
+        lines.append(f"Permutation p (exact): {perm['p_exact']:.4f}")
+    lines.append(f"t test p (normal theory): {perm['p_t']:.4g}")
+
+    return {"data": traces, "layout": layout}, {}, "\n".join(lines)
+
+
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,230 @@
+"""Shared handling of user-supplied data for the regression apps."""
+import io
+import csv
+import base64
+import binascii
+import hashlib
+import itertools
+from collections import OrderedDict
+
+import numpy as np
+import plotly.graph_objects as go
+
+
+# --- Limits on what we are willing to accept and draw
+
+max_upload_bytes = 50 * 2 ** 20
+max_rows = 2_000_000
+chunk_rows = 50_000
+
+# Above these sizes, switch from SVG to WebGL and then to server-side summaries
+webgl_threshold = 5_000
+density_threshold = 100_000
+max_display_points = 20_000
+
+# Keep only a few uploads in memory; the browser just holds the key
+max_cached_datasets = 8
+_datasets = OrderedDict()
+
+# Datasets that back the apps by default are never evicted
+_pinned = {}
+
+
+# --- Parse a CSV file from a dcc.Upload component
+
+def parse_upload(contents):
+    """Parse the base64 contents of an uploaded CSV into x and y arrays.
+
+    Uses the columns named "x" and "y" if there is a header containing them,
+    otherwise the first two columns. Rows with an empty field are skipped.
+    Raises ValueError with a message suitable for showing to the user.
+
+    """
+    _, _, encoded = contents.partition(",")
+    if len(encoded) * 3 // 4 > max_upload_bytes:
+        raise ValueError(
+            f"File is larger than {max_upload_bytes // 2 ** 20} MB"
+        )
+    try:
+        raw = base64.b64decode(encoded, validate=True)
+    except binascii.Error:
+        raise ValueError("Could not decode the uploaded file")
+
+    # Read the text one row at a time rather than building a full copy of it;
+    # utf-8-sig drops the byte-order mark that Excel writes at the start
+    text = io.TextIOWrapper(io.BytesIO(raw), encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+
+    try:
+        first = next(reader)
+    except StopIteration:
+        raise ValueError("File is empty")
+    except UnicodeDecodeError:
+        raise ValueError("File is not UTF-8 encoded text")
+
+    names = [name.strip().lower() for name in first]
+    try:
+        [float(val) for val in first[:2]]
+        header = False
+    except ValueError:
+        header = True
+
+    if header and "x" in names and "y" in names:
+        cols = names.index("x"), names.index("y")
+    elif len(names) >= 2:
+        cols = 0, 1
+    else:
+        raise ValueError("File needs at least two columns")
+
+    rows = reader if header else itertools.chain([first], reader)
+    chunks = []
+    n_rows = 0
+    try:
+        while True:
+            start_line = reader.line_num + 1 if header or chunks else 1
+            chunk = []
+            for row in itertools.islice(rows, chunk_rows):
+                try:
+                    x_val, y_val = row[cols[0]].strip(), row[cols[1]].strip()
+                except IndexError:
+                    continue
+                if x_val and y_val:
+                    chunk.append((x_val, y_val))
+            if not chunk:
+                break
+            n_rows += len(chunk)
+            if n_rows > max_rows:
+                raise ValueError(f"File has more than {max_rows} rows")
+            try:
+                chunks.append(np.array(chunk, dtype=float))
+            except ValueError:
+                raise ValueError(
+                    "Non-numeric value between lines "
+                    f"{start_line} and {reader.line_num}"
+                )
+    except UnicodeDecodeError:
+        raise ValueError("File is not UTF-8 encoded text")
+
+    if not chunks:
+        raise ValueError("File has no complete rows of data")
+    data = np.concatenate(chunks)
+    data = data[np.isfinite(data).all(axis=1)]
+    if len(data) < 3:
+        raise ValueError("Need at least three observations to fit a line")
+    if np.ptp(data[:, 0]) == 0:
+        raise ValueError("All of the x values are the same")
+    if np.ptp(data[:, 1]) == 0:
+        raise ValueError("All of the y values are the same")
+
+    return data[:, 0], data[:, 1]
+
+
+# --- Keep fits on the full dataset on the server, keyed by a short token
+
+def register_dataset(x, y, key=None, pinned=False):
+    """Compute summaries of a dataset once and cache them under a key.
+
+    Pinned datasets are kept for the life of the process; others are
+    evicted once more than max_cached_datasets have been registered.
+
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if key is None:
+        digest = hashlib.sha1(x.tobytes() + y.tobytes())
+        key = digest.hexdigest()[:16]
+    if get_dataset(key) is not None:
+        return key
+
+    n_obs = len(x)
+
+    # Sufficient statistics let us score any line without touching the data
+    xbar = x.mean()
+    ybar = y.mean()
+    ss_x = np.sum(np.square(x - xbar))
+    ss_y = np.sum(np.square(y - ybar))
+    sp_xy = np.sum((x - xbar) * (y - ybar))
+    slope = sp_xy / ss_x
+    intercept = ybar - slope * xbar
+    ss_res = np.sum(np.square(y - (intercept + slope * x)))
+
+    # Show a fixed random subset of very large datasets
+    if n_obs > max_display_points:
+        rng = np.random.default_rng(0)
+        display = np.sort(rng.choice(n_obs, max_display_points, replace=False))
+    else:
+        display = np.arange(n_obs)
+
+    data = dict(
+        x=x, y=y, n_obs=n_obs,
+        xbar=xbar, ybar=ybar, ss_x=ss_x, ss_y=ss_y, sp_xy=sp_xy,
+        intercept=intercept, slope=slope, ss_res=ss_res,
+        display=display,
+        xrange=_padded_range(x),
+        yrange=_padded_range(y),
+    )
+    if pinned:
+        _pinned[key] = data
+        return key
+
+    _datasets[key] = data
+    while len(_datasets) > max_cached_datasets:
+        _datasets.popitem(last=False)
+    return key
+
+
+def get_dataset(key):
+    """Return cached summaries of a dataset, or None if it has been evicted.
+
+    Apps can store their own derived results on the returned dict, so that
+    they are dropped along with the dataset.
+
+    """
+    if key in _pinned:
+        return _pinned[key]
+    if key not in _datasets:
+        return None
+    _datasets.move_to_end(key)
+    return _datasets[key]
+
+
+def sum_of_squares(data, intercept, slope):
+    """Residual sum of squares for a line using only the cached sums."""
+    offset = intercept + slope * data["xbar"] - data["ybar"]
+    return (
+        data["ss_y"]
+        - 2 * slope * data["sp_xy"]
+        + slope ** 2 * data["ss_x"]
+        + data["n_obs"] * offset ** 2
+    )
+
+
+def _padded_range(a, pad=.1):
+    lo, hi = np.percentile(a, [.1, 99.9])
+    if hi == lo:
+        lo, hi = lo - 1, hi + 1
+    span = hi - lo
+    return lo - pad * span, hi + pad * span
+
+
+# --- Draw the observations at a cost that does not grow with the data
+
+def points_trace(x, y, **kwargs):
+    """Markers as SVG for small datasets, WebGL for larger ones."""
+    trace = go.Scattergl if len(x) > webgl_threshold else go.Scatter
+    return trace(x=x, y=y, mode="markers", **kwargs)
+
+
+def density_trace(data, bins=100, **kwargs):
+    """Bin the observations on the server and draw the counts as a heatmap."""
+    if "density" not in data:
+        counts, xedges, yedges = np.histogram2d(
+            data["x"], data["y"],
+            bins=bins, range=[data["xrange"], data["yrange"]],
+        )
+        data["density"] = dict(
+            x=(xedges[:-1] + xedges[1:]) / 2,
+            y=(yedges[:-1] + yedges[1:]) / 2,
+            z=np.where(counts > 0, counts, np.nan).T,
+        )
+    return go.Heatmap(**data["density"], **kwargs)
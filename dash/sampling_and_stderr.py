@@ -7,7 +7,9 @@ from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 
 import numpy as np
-from scipy import stats
+
+import populations
+import simulations
 
 # --- Define the layout of the app
 
@@ -19,6 +21,15 @@ app.layout = html.Div([
 
     dcc.Graph(id="plots"),
 
+    html.Div([
+        html.H4("Population distribution", id="family-label"),
+        dcc.Dropdown(
+            id="family-dropdown",
+            options=populations.options(),
+            value="normal",
+            clearable=False,
+        ),
+    ]),
 
     html.Div([
         html.H4("Population standard deviation", id="population-label"),
@@ -50,16 +61,20 @@ app.layout = html.Div([
 
 @app.callback(
     Output("plots", "figure"),
-    [Input("population-slider", "value"), Input("sample-slider", "value")],
+    [Input("family-dropdown", "value"),
+     Input("population-slider", "value"),
+     Input("sample-slider", "value")],
 )
-def update_histograms(sd, sample_size):
+def update_histograms(family, sd, sample_size):
 
     # Define the population distribution
     sd = sd / 4  # Because of bug in slider with float values
-    d = stats.norm(0, sd)
 
     # Simulate n_sim experiments with a given true effect size and sample size
     n_sim = 1000
+    sim = simulations.simulate_sampling(
+        family, sd, sample_size, n_sim, rng=np.random.default_rng(),
+    )
 
     # Set up the figure to show the results of the simulation
     fig = make_subplots(
@@ -72,16 +87,18 @@ def update_histograms(sd, sample_size):
         ]
     )
 
-    # Plot the probability density function of the population
-    x = np.linspace(-9, 9, 5001)
-    y = d.pdf(x)
-    t_hist = go.Scatter(x=x, y=y, mode="lines", showlegend=False)
+    # Plot the probability density (or mass) function of the population
+    x, y = populations.density(family, sd)
+    if populations.is_discrete(family):
+        t_hist = go.Bar(x=x, y=y, width=.1, showlegend=False)
+    else:
+        t_hist = go.Scatter(x=x, y=y, mode="lines", showlegend=False)
     fig.add_trace(t_hist, row=1, col=1)
     fig.update_xaxes(range=[-9, 9], row=1, col=1)
-    fig.update_yaxes(range=[0, .55], row=1, col=1)
+    fig.update_yaxes(range=[0, max(.55, y.max() * 1.1)], row=1, col=1)
 
     # Plot a histogram of one sample
-    sample = d.rvs(sample_size)
+    sample = sim["sample"]
     bins = dict(start=-9, end=9, size=1)
     hist = go.Histogram(x=sample, autobinx=False, xbins=bins, showlegend=False)
     fig.add_trace(hist, row=1, col=2)
@@ -89,8 +106,7 @@ def update_histograms(sd, sample_size):
     fig.update_yaxes(range=[0, sample_size * .75], row=1, col=2)
 
     # Plot a histogram of the means from many samples
-    samples = d.rvs((sample_size, n_sim))
-    means = samples.mean(axis=0)
+    means = sim["means"]
     bins = dict(start=-9, end=9, size=.2)
     hist = go.Histogram(x=means, autobinx=False, xbins=bins, showlegend=False)
     fig.add_trace(hist, row=1, col=3)
@@ -98,9 +114,7 @@ def update_histograms(sd, sample_size):
     fig.update_yaxes(range=[0, n_sim * .55], row=1, col=3)
 
     # Annotate with descriptive statistics
-    mean = sample.mean()
-    stdev = sample.std()
-    sem = stdev / np.sqrt(sample_size)
+    mean, stdev, sem = sim["mean"], sim["stdev"], sim["sem"]
 
     annot_ys = .85, .8, .75
     for col in [1, 2, 3]:
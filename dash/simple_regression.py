@@ -1,7 +1,7 @@
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 
 import plotly.graph_objects as go
@@ -9,6 +9,8 @@ import plotly.graph_objects as go
 import numpy as np
 import statsmodels.api as sm
 
+import regression_data
+
 
 # --- Define the underlying regression model
 
@@ -25,6 +27,58 @@ starting_intercept = np.random.choice(intercept_options)
 slope_options = np.arange(-1, 3.25, .25)
 starting_slope = np.random.choice(slope_options)
 
+default_key = regression_data.register_dataset(
+    x, y, key="default", pinned=True,
+)
+
+# Slider options and axis limits live on each dataset's cache entry
+regression_data.get_dataset(default_key)["view"] = dict(
+    intercept_options=intercept_options,
+    slope_options=slope_options,
+    start=(starting_intercept, starting_slope),
+    reference=(true_intercept, true_slope),
+    xrange=(-5, 5),
+    yrange=(-3, 7),
+    score_max=1000,
+    resid_scale=1,
+)
+
+expired_message = (
+    "The uploaded data is no longer stored on the server, so the simulated "
+    "data is shown instead; upload the file again to use it"
+)
+
+
+def lookup(key):
+    """Return the data and plotting parameters for a dataset.
+
+    Falls back to the default data if the dataset has been evicted.
+
+    """
+    data = regression_data.get_dataset(key)
+    if data is None:
+        data = regression_data.get_dataset(default_key)
+    if "view" in data:
+        return data, data["view"]
+
+    # With user data there is no true model, so center everything on the OLS
+    # fit and scale the slider steps and axes to the spread of the data
+    x_sd = np.sqrt(data["ss_x"] / data["n_obs"])
+    y_sd = np.sqrt(data["ss_y"] / data["n_obs"])
+    resid_sd = np.sqrt(data["ss_res"] / (data["n_obs"] - 2))
+    steps = np.arange(-8, 9)
+    data["view"] = dict(
+        intercept_options=data["intercept"] + steps * y_sd / 5,
+        slope_options=data["slope"] + steps * y_sd / x_sd / 5,
+        start=None,
+        reference=(data["intercept"], data["slope"]),
+        xrange=data["xrange"],
+        yrange=data["yrange"],
+        score_max=20 * data["ss_res"],
+        resid_scale=resid_sd,
+    )
+    return data, data["view"]
+
 
 # --- Define the layout of the app
 
@@ -34,6 +88,25 @@ app.layout = dbc.Container([
 
     html.H1("Simple linear regression"),
 
+    dcc.Store(id="dataset", data=default_key),
+    dcc.Interval(id="expiry-check", interval=2000),
+
+    dcc.Upload(
+        id="upload-data",
+        children=html.Div([
+            "Drag and drop or ", html.A("select a CSV file"),
+            " with x and y columns to use your own data",
+        ]),
+        max_size=regression_data.max_upload_bytes,
+        style={
+            "borderWidth": "1px", "borderStyle": "dashed",
+            "borderRadius": "5px", "textAlign": "center",
+            "padding": "10px", "margin": "10px 0",
+        },
+    ),
+
+    html.Div(id="upload-status"),
+
     html.Div([
         dbc.Row([
             dbc.Col(
@@ -85,12 +158,74 @@ app.layout = dbc.Container([
 ])
 
 
+# --- Load a user-supplied dataset and adapt the controls to it
+
+
+@app.callback(
+    [Output("dataset", "data"), Output("upload-status", "children")],
+    [Input("upload-data", "contents"), Input("expiry-check", "n_intervals")],
+    [State("upload-data", "filename"), State("dataset", "data")],
+)
+def load_upload(contents, _, filename, key):
+
+    # Other uploads can evict this one; switching back to the default data
+    # here also resets the sliders to its scale
+    triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+    if "expiry-check.n_intervals" in triggered:
+        if regression_data.get_dataset(key) is None:
+            return default_key, expired_message
+        return dash.no_update, dash.no_update
+
+    if contents is None:
+        return default_key, ""
+    try:
+        x_up, y_up = regression_data.parse_upload(contents)
+    except ValueError as err:
+        return dash.no_update, f"Could not use {filename}: {err}"
+    key = regression_data.register_dataset(x_up, y_up)
+    return key, f"Using {filename} ({len(x_up)} observations)"
+
+
+@app.callback(
+    [Output("intercept-slider", "min"),
+     Output("intercept-slider", "max"),
+     Output("intercept-slider", "step"),
+     Output("intercept-slider", "marks"),
+     Output("intercept-slider", "value"),
+     Output("slope-slider", "min"),
+     Output("slope-slider", "max"),
+     Output("slope-slider", "step"),
+     Output("slope-slider", "marks"),
+     Output("slope-slider", "value")],
+    [Input("dataset", "data")],
+)
+def set_sliders(key):
+
+    _, view = lookup(key)
+    outputs = []
+    for name in ["intercept", "slope"]:
+        options = view[f"{name}_options"]
+        if view["start"] is not None:
+            value = dict(zip(["intercept", "slope"], view["start"]))[name]
+        else:
+            value = np.random.choice(options)
+        outputs.extend([
+            options[0],
+            options[-1],
+            options[1] - options[0],
+            {val: "" for val in options},
+            value,
+        ])
+
+    return outputs
+
+
 @app.callback(
     Output("intercept-label", "children"),
     [Input("intercept-slider", "value")],
 )
 def label_intercept(intercept):
-    return f"Intercept = {intercept:.1f}"
+    return f"Intercept = {intercept:.3g}"
 
 
 @app.callback(
@@ -98,7 +233,11 @@ def label_intercept(intercept):
     [Input("slope-slider", "value")],
 )
 def label_slope(slope):
-    return f"Slope = {slope:.1f}"
+    return f"Slope = {slope:.3g}"
+
+
+def is_best_fit(view, intercept, slope):
+    return np.allclose((intercept, slope), view["reference"])
 
 
 # --- Draw a scatter plot of the data and the specified regression line
@@ -106,22 +245,36 @@ def label_slope(slope):
 
 @app.callback(
     Output("scatter-plot", "figure"),
-    [Input("intercept-slider", "value"), Input("slope-slider", "value")],
+    [Input("dataset", "data"),
+     Input("intercept-slider", "value"),
+     Input("slope-slider", "value")],
 )
-def plot_scatter(intercept, slope):
+def plot_scatter(key, intercept, slope):
+
+    data, view = lookup(key)
 
     fig = go.Figure()
     fig.update_layout(
         width=500, height=500,
     )
-    fig.update_xaxes(range=(-5, 5), title="x")
-    fig.update_yaxes(range=(-3, 7), title="y")
-
-    fig.add_trace(go.Scatter(x=x, y=y, mode="markers", showlegend=False))
+    fig.update_xaxes(range=view["xrange"], title="x")
+    fig.update_yaxes(range=view["yrange"], title="y")
+
+    # Very large datasets are summarized on the server instead of drawn, and
+    # otherwise only a fixed subset of the observations is sent each time
+    if data["n_obs"] > regression_data.density_threshold:
+        fig.add_trace(regression_data.density_trace(
+            data, colorscale="Greys", showscale=False, hoverinfo="skip",
+        ))
+    else:
+        display = data["display"]
+        fig.add_trace(regression_data.points_trace(
+            data["x"][display], data["y"][display], showlegend=False,
+        ))
 
-    xx = np.linspace(-5, 5, 100)
+    xx = np.linspace(*view["xrange"], 100)
     yy = intercept + slope * xx
-    best_fit = intercept == true_intercept and slope == true_slope
+    best_fit = is_best_fit(view, intercept, slope)
     color = "#636EFA" if best_fit else "#EF553B"
     fig.add_trace(go.Scatter(x=xx, y=yy, mode="lines",
                              line=dict(color=color),
@@ -135,24 +288,27 @@ def plot_scatter(intercept, slope):
 
 @app.callback(
     Output("score-plot", "figure"),
-    [Input("intercept-slider", "value"), Input("slope-slider", "value")],
+    [Input("dataset", "data"),
+     Input("intercept-slider", "value"),
+     Input("slope-slider", "value")],
 )
-def plot_score(intercept, slope):
+def plot_score(key, intercept, slope):
 
-    yhat = intercept + slope * x
-    ss_res = np.sum(np.square(y - yhat))
+    data, view = lookup(key)
 
-    y_opt = true_intercept + true_slope * x
-    ss_res_opt = np.sum(np.square(y - y_opt))
+    # Use cached sums so scoring a line does not depend on the size of the data
+    ss_res = regression_data.sum_of_squares(data, intercept, slope)
+    ss_res_opt = regression_data.sum_of_squares(data, *view["reference"])
 
     fig = go.Figure()
     fig.update_layout(
         width=500, height=200,
     )
-    fig.update_xaxes(range=(0, 1000), title="Sum of squares of residuals")
+    fig.update_xaxes(range=(0, view["score_max"]),
+                     title="Sum of squares of residuals")
     fig.update_yaxes(range=(0, 1), showticklabels=False)
 
-    best_fit = intercept == true_intercept and slope == true_slope
+    best_fit = is_best_fit(view, intercept, slope)
     fig.add_trace(go.Scatter(x=[ss_res, ss_res_opt], y=[.5, .5],
                   mode="markers", marker_size=10,
                   marker_symbol=["asterisk-open", "circle-open"],
@@ -170,26 +326,34 @@ def plot_score(intercept, slope):
 
 @app.callback(
     Output("resid-plot", "figure"),
-    [Input("intercept-slider", "value"), Input("slope-slider", "value")],
+    [Input("dataset", "data"),
+     Input("intercept-slider", "value"),
+     Input("slope-slider", "value")],
 )
-def plot_residuals(intercept, slope):
+def plot_residuals(key, intercept, slope):
 
-    yhat = intercept + slope * x
-    residuals = y - yhat
-    best_fit = intercept == true_intercept and slope == true_slope
+    data, view = lookup(key)
+
+    yhat = intercept + slope * data["x"]
+    residuals = data["y"] - yhat
+    best_fit = is_best_fit(view, intercept, slope)
+
+    # Bin on the server so only the counts are sent to the browser
+    scale = view["resid_scale"]
+    edges = np.arange(-5, 5.5, .5) * scale
+    counts, _ = np.histogram(residuals, edges)
 
     fig = go.Figure()
     fig.update_layout(
         width=500, height=300,
     )
-    fig.update_xaxes(range=(-5, 5), title="Residuals")
-    fig.update_yaxes(range=(0, 20), title="Count")
+    fig.update_xaxes(range=(edges[0], edges[-1]), title="Residuals")
+    fig.update_yaxes(range=(0, .4 * data["n_obs"]), title="Count")
 
-    bins = dict(start=-5, end=5, size=.5)
     fig.add_trace(
-        go.Histogram(x=residuals,
-                     marker_color="#636EFA" if best_fit else "#EF553B",
-                     autobinx=False, xbins=bins, showlegend=False),
+        go.Bar(x=edges[:-1], y=counts, width=np.diff(edges), offset=0,
+               marker_color="#636EFA" if best_fit else "#EF553B",
+               showlegend=False),
     )
 
     fig.update_layout(shapes=[
@@ -204,14 +368,21 @@ def plot_residuals(intercept, slope):
     return fig
 
 
+def ols_summary(key):
+    data, _ = lookup(key)
+    if "ols_summary" not in data:
+        m = sm.OLS(data["y"], sm.add_constant(data["x"])).fit()
+        data["ols_summary"] = m.summary().as_text()
+    return data["ols_summary"]
+
+
 @app.callback(
     Output("results-text", "children"),
-    [Input("results-check", "value")],
+    [Input("dataset", "data"), Input("results-check", "value")],
 )
-def print_ols_fit(checked):
+def print_ols_fit(key, checked):
     if checked:
-        m = sm.OLS(y, sm.add_constant(x)).fit()
-        return m.summary().as_text()
+        return ols_summary(key)
     else:
         return ""
 
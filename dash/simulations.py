@@ -0,0 +1,187 @@
+"""Statistical simulations behind the Dash apps, without any plotting.
+
+Each function takes an explicit numpy Generator so that results can be
+reproduced and so that the functions can run in worker processes.
+
+"""
+import itertools
+
+import numpy as np
+from scipy import stats
+
+import populations
+
+
+# --- One-sample t tests (ttest_simulation)
+
+def simulate_ttests(effect_size, sample_size, n_sim=1000, alpha=.05, *, rng):
+    """Run many one-sample t tests on data with a given true effect size."""
+
+    # Sample data for all experiments at once
+    sample = rng.normal(effect_size, 1, (sample_size, n_sim))
+
+    # Compute the mean and standard error for each experiment
+    means = sample.mean(axis=0)
+    sems = sample.std(axis=0) / np.sqrt(sample_size)
+
+    # Compute the t statistic and corresponding (one-tailed) p value
+    dof = sample_size - 1
+    t_dist = stats.t(dof)
+    ts = means / sems
+    ps = t_dist.sf(ts)
+
+    # Compute the critical values
+    t_crit = t_dist.ppf(1 - alpha)
+    p_crit = alpha
+
+    # Compute the theoretical power and empirical proportion of rejected nulls
+    if effect_size:
+        effect_dist = stats.t(dof, loc=effect_size * np.sqrt(sample_size))
+        theory_power = effect_dist.sf(t_crit)
+    else:
+        theory_power = np.nan
+    rejected_nulls = (ts > t_crit).mean()
+
+    return dict(
+        ts=ts, ps=ps, t_crit=t_crit, p_crit=p_crit,
+        theory_power=theory_power, rejected_nulls=rejected_nulls,
+    )
+
+
+# --- Sampling distribution of the mean (sampling_and_stderr)
+
+def simulate_sampling(family, sd, sample_size, n_sim=1000, *, rng):
+    """Draw one sample and n_sim more samples from a population."""
+    sample = populations.draw(family, sd, sample_size, rng)
+    samples = populations.draw(family, sd, (sample_size, n_sim), rng)
+
+    mean = sample.mean()
+    stdev = sample.std()
+    sem = stdev / np.sqrt(sample_size)
+
+    return dict(
+        sample=sample,
+        mean=mean, stdev=stdev, sem=sem,
+        means=samples.mean(axis=0),
+        sems=samples.std(axis=0) / np.sqrt(sample_size),
+    )
+
+
+# --- Uncertainty in a simple regression (regression_bootstrap)
+
+def simulate_regression(n_obs, sd, intercept=2, slope=.75, xlim=3, *, rng):
+    """Simulate observations from a y = ax + b + noise model."""
+    x = rng.uniform(-xlim, xlim, n_obs)
+    y = intercept + slope * x + rng.normal(0, sd, n_obs)
+    return x, y
+
+
+def regression_ci(x, y, xx, level=.95):
+    """Fit a regression with OLS and its analytic confidence band at xx."""
+    n_obs = len(x)
+    xbar = x.mean()
+    ybar = y.mean()
+    ss_x = np.sum(np.square(x - xbar))
+    slope = np.sum((x - xbar) * (y - ybar)) / ss_x
+    intercept = ybar - slope * xbar
+    yhat = intercept + slope * xx
+
+    dof = n_obs - 2
+    s = np.sqrt(np.sum(np.square(y - (intercept + slope * x))) / dof)
+    se_x = s * np.sqrt(1 / n_obs + np.square(xx - xbar) / ss_x)
+    z = stats.t(dof).ppf(1 - (1 - level) / 2)
+    ci = yhat - z * se_x, yhat + z * se_x
+
+    return dict(
+        intercept=intercept, slope=slope, se_slope=s / np.sqrt(ss_x),
+        yhat=yhat, dof=dof, se_x=se_x, ci=ci,
+    )
+
+
+def bootstrap_regression(x, y, xx, n_boot, *, rng):
+    """Refit the regression on bootstrap resamples of the observations.
+
+    Each resample is represented by how often it draws each observation
+    (capped at 255 in the returned counts), so the fit is a weighted sum
+    over the data rather than a copy of it.
+
+    """
+    n_obs = len(x)
+    xc = x - x.mean()
+    yc = y - y.mean()
+    terms = np.column_stack([np.ones(n_obs), xc, yc, xc * xc, xc * yc])
+
+    boot_counts = np.empty((n_boot, n_obs), np.uint8)
+    boot_sums = np.empty((n_boot, terms.shape[1]))
+    for i in range(n_boot):
+        sampler = rng.integers(0, n_obs, n_obs)
+        counts = np.bincount(sampler, minlength=n_obs)
+        boot_counts[i] = np.minimum(counts, 255)
+        boot_sums[i] = counts @ terms
+
+    n, sx, sy, sxx, sxy = boot_sums.T
+    slopes = (n * sxy - sx * sy) / (n * sxx - sx ** 2)
+    intercepts = y.mean() + (sy - slopes * sx) / n - slopes * x.mean()
+    yhat_boots = intercepts[:, None] + slopes[:, None] * xx
+
+    return dict(
+        intercepts=intercepts, slopes=slopes,
+        boot_counts=boot_counts, yhat_boots=yhat_boots,
+    )
+
+
+def permutation_test(x, y, n_perm, max_exact=8, block_size=2 ** 22, *, rng):
+    """Test the regression slope by shuffling y relative to x.
+
+    The null slopes come from a batched product of the centered x with an
+    (n_perm, n_obs) array of permuted y values, built in blocks of about
+    block_size elements to bound memory. Returns a two-sided Monte Carlo
+    p value and its standard error, the exact permutation p value when
+    there are no more than max_exact observations (so that all orderings
+    can be enumerated), and the p value from the usual t test.
+
+    """
+    n_obs = len(x)
+    xc = x - x.mean()
+    yc = y - y.mean()
+    ss_x = xc @ xc
+
+    def null_slopes(perms):
+        return yc[perms] @ xc / ss_x
+
+    def p_value(slopes):
+        # Allow for rounding error so the identity ordering counts as a tie
+        extreme = np.abs(slopes) >= np.abs(slope) * (1 - 1e-10)
+        return extreme.sum(), len(slopes)
+
+    slope = null_slopes(np.arange(n_obs))
+
+    rows = max(1, block_size // n_obs)
+    blocks = []
+    for start in range(0, n_perm, rows):
+        perms = np.tile(np.arange(n_obs), (min(rows, n_perm - start), 1))
+        rng.permuted(perms, axis=1, out=perms)
+        blocks.append(null_slopes(perms))
+    slopes = np.concatenate(blocks)
+
+    # Count the observed ordering as one of the shuffles
+    n_extreme, _ = p_value(slopes)
+    p_mc = (n_extreme + 1) / (n_perm + 1)
+    p_mc_se = np.sqrt(p_mc * (1 - p_mc) / n_perm)
+
+    if n_obs <= max_exact:
+        perms = np.array(list(itertools.permutations(range(n_obs))))
+        n_extreme, n_total = p_value(null_slopes(perms))
+        p_exact = n_extreme / n_total
+    else:
+        p_exact = np.nan
+
+    dof = n_obs - 2
+    resid = yc - slope * xc
+    se_slope = np.sqrt(resid @ resid / dof / ss_x)
+    p_t = 2 * stats.t(dof).sf(np.abs(slope / se_slope))
+
+    return dict(
+        slope=slope, null_slopes=slopes,
+        p_mc=p_mc, p_mc_se=p_mc_se, p_exact=p_exact, p_t=p_t,
+    )
@@ -0,0 +1,202 @@
+"""Run parameter sweeps of the app simulations from the command line.
+
+Each combination of parameters is simulated in a separate worker process
+with its own child seed, so a sweep gives the same results regardless of
+how many processes run it. Results are written with one row per cell and
+one column per parameter or summary statistic, either as a Parquet file
+(requires pyarrow) or as a numpy .npz archive of columns.
+
+Examples:
+
+    python sweep.py --out ttest.parquet ttest \\
+        --effect-size 0 .2 .5 .8 --sample-size 10 20 50
+    python sweep.py --out sampling.npz sampling \\
+        --family normal skewed binary --sd 1 2 --sample-size 5 30 100
+    python sweep.py --out bootstrap.parquet --reps 100 bootstrap \\
+        --sample-size 30 100 --sd 1.5 --n-boot 200 1000
+
+"""
+import os
+import sys
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import populations
+import simulations
+
+
+# --- Summaries of one simulation per parameter combination
+
+def ttest_cell(effect_size, sample_size, n_sim, seed):
+    rng = np.random.default_rng(seed)
+    sim = simulations.simulate_ttests(effect_size, sample_size, n_sim, rng=rng)
+    return dict(
+        theory_power=sim["theory_power"],
+        rejected_nulls=sim["rejected_nulls"],
+        mean_t=sim["ts"].mean(),
+        median_p=np.median(sim["ps"]),
+    )
+
+
+def sampling_cell(family, sd, sample_size, n_sim, seed):
+    rng = np.random.default_rng(seed)
+    sim = simulations.simulate_sampling(
+        family, sd, sample_size, n_sim, rng=rng,
+    )
+    return dict(
+        expected_sem=sd / np.sqrt(sample_size),
+        mean_of_means=sim["means"].mean(),
+        sd_of_means=sim["means"].std(),
+        mean_sem=sim["sems"].mean(),
+    )
+
+
+def bootstrap_cell(sample_size, sd, n_boot, seed):
+    rng = np.random.default_rng(seed)
+    x, y = simulations.simulate_regression(sample_size, sd, rng=rng)
+    xx = np.array([0.])
+    fit = simulations.regression_ci(x, y, xx)
+    boots = simulations.bootstrap_regression(x, y, xx, n_boot, rng=rng)
+    boot_lo, boot_hi = np.percentile(boots["slopes"], [2.5, 97.5])
+    return dict(
+        slope=fit["slope"],
+        se_slope=fit["se_slope"],
+        boot_sd_slope=boots["slopes"].std(),
+        boot_ci_low=boot_lo,
+        boot_ci_high=boot_hi,
+    )
+
+
+cells = {
+    "ttest": (ttest_cell, ["effect_size", "sample_size", "n_sim"]),
+    "sampling": (sampling_cell, ["family", "sd", "sample_size", "n_sim"]),
+    "bootstrap": (bootstrap_cell, ["sample_size", "sd", "n_boot"]),
+}
+
+# Smallest counts that give a meaningful simulation; any sd must be positive
+minimums = {
+    "ttest": dict(sample_size=2, n_sim=1),
+    "sampling": dict(sample_size=1, n_sim=1),
+    "bootstrap": dict(sample_size=3, n_boot=1),
+}
+
+
+def _run_cell(task):
+    kind, params, seed = task
+    func, _ = cells[kind]
+    return func(*params, seed)
+
+
+# --- Running the sweep and saving the results
+
+def run_sweep(kind, grid, reps=1, seed=None, jobs=None):
+    """Simulate every combination of parameters and return result columns.
+
+    The entropy of the sweep's SeedSequence is stored in a "seed" column, so
+    passing it back as seed reproduces a sweep that was run without one.
+
+    """
+    _, names = cells[kind]
+    combos = [
+        params + (rep,)
+        for params in itertools.product(*[grid[name] for name in names])
+        for rep in range(reps)
+    ]
+    seed_seq = np.random.SeedSequence(seed)
+    seeds = seed_seq.spawn(len(combos))
+    tasks = [(kind, combo[:-1], s) for combo, s in zip(combos, seeds)]
+
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (4 * jobs))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(_run_cell, tasks, chunksize=chunksize))
+
+    columns = {
+        name: np.array([combo[i] for combo in combos])
+        for i, name in enumerate(names + ["rep"])
+    }
+    columns["seed"] = np.full(len(combos), str(seed_seq.entropy))
+    for stat in results[0]:
+        columns[stat] = np.array([res[stat] for res in results])
+    return columns
+
+
+def write_columns(columns, path):
+    """Save result columns to a Parquet file or a numpy .npz archive."""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Writing Parquet files requires pyarrow")
+        pq.write_table(pa.table(columns), path)
+    elif path.endswith(".npz"):
+        np.savez_compressed(path, **columns)
+    else:
+        raise ValueError("Output file must end with .parquet or .npz")
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--out", required=True,
+                        help="output file (.parquet or .npz)")
+    parser.add_argument("--reps", type=int, default=1,
+                        help="independent repeats of each combination")
+    parser.add_argument("--seed", type=int,
+                        help="seed for the whole sweep")
+    parser.add_argument("--jobs", type=int,
+                        help="number of worker processes (default: all cores)")
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+
+    ttest = subparsers.add_parser("ttest", help="one-sample t tests")
+    ttest.add_argument("--effect-size", type=float, nargs="+", default=[0])
+    ttest.add_argument("--sample-size", type=int, nargs="+", default=[20])
+    ttest.add_argument("--n-sim", type=int, nargs="+", default=[1000])
+
+    sampling = subparsers.add_parser("sampling", help="means of samples")
+    sampling.add_argument("--family", nargs="+", default=["normal"],
+                          choices=list(populations.populations))
+    sampling.add_argument("--sd", type=float, nargs="+", default=[2.5])
+    sampling.add_argument("--sample-size", type=int, nargs="+", default=[100])
+    sampling.add_argument("--n-sim", type=int, nargs="+", default=[1000])
+
+    bootstrap = subparsers.add_parser("bootstrap", help="regression bootstrap")
+    bootstrap.add_argument("--sample-size", type=int, nargs="+", default=[30])
+    bootstrap.add_argument("--sd", type=float, nargs="+", default=[1.5])
+    bootstrap.add_argument("--n-boot", type=int, nargs="+", default=[1000])
+
+    args = parser.parse_args(argv)
+    if not args.out.endswith((".parquet", ".npz")):
+        parser.error("--out must end with .parquet or .npz")
+    if args.reps < 1:
+        parser.error("--reps must be at least 1")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.out.endswith(".parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("writing Parquet files requires pyarrow")
+    _, names = cells[args.kind]
+    grid = {name: getattr(args, name) for name in names}
+    for name, low in minimums[args.kind].items():
+        if min(grid[name]) < low:
+            flag = "--" + name.replace("_", "-")
+            parser.error(f"{flag} values must be at least {low}")
+    if "sd" in grid and min(grid["sd"]) <= 0:
+        parser.error("--sd values must be positive")
+
+    columns = run_sweep(args.kind, grid, args.reps, args.seed, args.jobs)
+    print(f"Sweep seed: {columns['seed'][0]}", file=sys.stderr)
+    try:
+        write_columns(columns, args.out)
+    except (RuntimeError, ValueError) as err:
+        sys.exit(str(err))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 
 import numpy as np
-from scipy import stats
+
+import simulations
 
 # --- Define the layout of the app
 
@@ -75,35 +76,14 @@ def update_histograms(effect_size, sample_size):
 
     # Simulate n_sim experiments with a given true effect size and sample size
     n_sim = 1000
-
-    # Sample data for all experiments at once
-    sample = np.random.normal(effect_size, 1, (sample_size, n_sim))
-
-    # Compute the mean and standard error for each experiment
-    means = sample.mean(axis=0)
-    sems = sample.std(axis=0) / np.sqrt(sample_size)
-
-    # Compute the t statistic and corresponding (one-tailed) p value
-    dof = sample_size - 1
-    t_dist = stats.t(dof)
-    ts = means / sems
-    ps = t_dist.sf(ts)
-
-    # Compute the critical values
-    alpha = .05
-    t_crit = t_dist.ppf(1 - alpha)
-    p_crit = alpha
-
-    # Compute the theoretical power and empirical proportion of rejected nulls
-    if effect_size:
-        effect_dist = stats.t(dof, loc=effect_size * np.sqrt(sample_size))
-        theory_power = effect_dist.sf(t_crit)
-    else:
-        theory_power = np.nan
-    rejected_nulls = (ts > t_crit).mean()
+    sim = simulations.simulate_ttests(
+        effect_size, sample_size, n_sim, rng=np.random.default_rng(),
+    )
+    ts, ps = sim["ts"], sim["ps"]
+    t_crit, p_crit = sim["t_crit"], sim["p_crit"]
     titles = (
-        f"Theoretical power: {theory_power:.2f}",
-        f"Proportion rejected nulls: {rejected_nulls:.2f}",
+        f"Theoretical power: {sim['theory_power']:.2f}",
+        f"Proportion rejected nulls: {sim['rejected_nulls']:.2f}",
     )
 
     # Set up the figure to show the results of the simulation